@@ -4,27 +4,79 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any
-import shutil
 import os
-import base64
+import re
+import pybase64
+import cv2
 import uuid
 from datetime import datetime
 import asyncio
+from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from dotenv import load_dotenv
-from detector import detect_holds, create_highlighted_image
+from detector import (
+    get_model,
+    detect_holds,
+    decode_base64_image,
+    decode_image_bytes,
+    encode_jpeg,
+    encode_comparison_jpeg,
+    create_highlighted_image_from_array,
+)
 
 # Load environment variables
 load_dotenv()
 
-# Thread pool executor for blocking operations (prevents terminal freezing)
-executor = ThreadPoolExecutor(max_workers=2)
+# Thread pool executor for blocking operations (prevents terminal freezing).
+# Sized for I/O-bound work so reference image reads and Gemini calls don't serialize.
+executor = ThreadPoolExecutor(
+    max_workers=min(32, (os.cpu_count() or 4) * 4),
+    thread_name_prefix="pebl-io"
+)
+
+# --- Gemini model (cached globally) ---
+_gemini_model = None
+_gemini_model_lock = asyncio.Lock()
 
-# Thread pool executor for blocking operations
-executor = ThreadPoolExecutor(max_workers=2)
+async def get_gemini_model():
+    """Get or initialize the Gemini model (singleton pattern)"""
+    global _gemini_model
+    if _gemini_model is None:
+        async with _gemini_model_lock:
+            if _gemini_model is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY environment variable is not set")
+                
+                genai.configure(api_key=api_key)
+                _gemini_model = genai.GenerativeModel('gemini-3-pro-preview')
+    return _gemini_model
+
+# Matches the reference image Gemini names in its answer, e.g. "Image 2", "2nd image", "second image"
+_IMAGE_REF_RE = re.compile(
+    r"image\s*(\d+)|(\d+)(?:st|nd|rd|th)\s+image"
+    r"|(first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth)\s+image"
+)
+_ORDINAL_WORDS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+}
+
+# Downscaled JPEG bytes of saved blue route images: filename -> (mtime, size, bytes)
+_blue_image_cache: Dict[str, tuple] = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Initialize the Roboflow model at startup so the first request doesn't pay for it
+    try:
+        await asyncio.get_event_loop().run_in_executor(executor, get_model)
+    except Exception as e:
+        # Log error but still start; detection will retry on first use
+        print(f"Roboflow model warmup failed: {str(e)}")
+    yield
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,33 +93,22 @@ async def detect_holds_api(file: UploadFile = File(...)):
     Returns:
         dict: Contains 'json' (detection results) and 'image_base64' (labeled image)
     """
-    # Generate unique filename to avoid conflicts
-    file_extension = os.path.splitext(file.filename)[1] or ".jpg"
-    unique_id = str(uuid.uuid4())[:8]
-    filepath = f"temp_upload_{unique_id}{file_extension}"
-    
     try:
         # Validate file type
         if not file.content_type or not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Save uploaded file
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Read uploaded file into memory (no temporary file on disk)
+        image_bytes = await file.read()
         
-        # Run detection
-        detections_data, original_image_path = detect_holds(filepath)
+        # Run detection in the thread pool so the Roboflow HTTP call and image
+        # processing don't block the event loop for other requests
+        loop = asyncio.get_event_loop()
+        detections_data, resized_img = await loop.run_in_executor(executor, detect_holds, image_bytes)
         
         # Encode original image (without labels) as base64
-        with open(original_image_path, "rb") as f:
-            img_bytes = f.read()
-        img_base64 = base64.b64encode(img_bytes).decode("utf-8")
-        
-        # Cleanup temporary files
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        if os.path.exists(original_image_path):
-            os.remove(original_image_path)
+        img_bytes = await loop.run_in_executor(executor, encode_jpeg, resized_img)
+        img_base64 = pybase64.b64encode_as_string(img_bytes)
         
         return {
             "success": True,
@@ -79,14 +120,10 @@ async def detect_holds_api(file: UploadFile = File(...)):
         }
         
     except ValueError as e:
-        # Cleanup on error
-        if os.path.exists(filepath):
-            os.remove(filepath)
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
-        # Cleanup on error
-        if os.path.exists(filepath):
-            os.remove(filepath)
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 class SelectRequest(BaseModel):
@@ -118,18 +155,30 @@ async def select_holds_api(id: str, request: SelectRequest):
             # Remove data URI prefix (e.g., "data:image/jpeg;base64,")
             image_base64 = image_base64.split(",", 1)[1]
         
-        # Create blue highlighted image (BGR: (255, 0, 0) = blue)
-        blue_image_base64 = create_highlighted_image(
-            image_base64,
-            request.selected_detections,
-            highlight_color=(255, 0, 0)  # Blue in BGR
+        # Decode the image once and draw both highlights from the same array.
+        # Image work runs in the thread pool (OpenCV releases the GIL) so the event loop stays free.
+        loop = asyncio.get_event_loop()
+        img = await loop.run_in_executor(executor, decode_base64_image, image_base64)
+        
+        # Create blue (BGR: (255, 0, 0)) and red (BGR: (0, 0, 255)) highlighted images concurrently.
+        # img is freshly decoded, so blue is drawn on it in place and only red needs a copy
+        # (taken before either render starts).
+        red_src = img.copy()
+        blue_img, red_img = await asyncio.gather(
+            loop.run_in_executor(
+                executor, create_highlighted_image_from_array,
+                img, request.selected_detections, (255, 0, 0)  # Blue in BGR
+            ),
+            loop.run_in_executor(
+                executor, create_highlighted_image_from_array,
+                red_src, request.selected_detections, (0, 0, 255)  # Red in BGR
+            ),
         )
         
-        # Create red highlighted image (BGR: (0, 0, 255) = red)
-        red_image_base64 = create_highlighted_image(
-            image_base64,
-            request.selected_detections,
-            highlight_color=(0, 0, 255)  # Red in BGR
+        # Only the red image is needed for the comparison; blue is encoded once we know it's a new route
+        red_img_bytes, red_query_bytes = await asyncio.gather(
+            loop.run_in_executor(executor, encode_jpeg, red_img),
+            loop.run_in_executor(executor, encode_comparison_jpeg, red_img),
         )
         
         # Get current working directory (backend directory) and create images directory
@@ -145,7 +194,7 @@ async def select_holds_api(id: str, request: SelectRequest):
         
         try:
             gemini_response, matching_image_filename, is_match = await compare_with_gemini(
-                red_image_base64, images_dir
+                red_query_bytes, images_dir
             )
         except Exception as e:
             # Log error but don't fail the request
@@ -169,13 +218,16 @@ async def select_holds_api(id: str, request: SelectRequest):
         blue_path = os.path.join(images_dir, blue_filename)
         red_path = os.path.join(images_dir, red_filename)
         
-        # Decode and save blue image
-        blue_img_bytes = base64.b64decode(blue_image_base64)
+        # Encode blue image (skipped entirely when the route already exists)
+        blue_img_bytes = await loop.run_in_executor(executor, encode_jpeg, blue_img)
+        blue_image_base64 = pybase64.b64encode_as_string(blue_img_bytes)
+        red_image_base64 = pybase64.b64encode_as_string(red_img_bytes)
+        
+        # Save blue image
         with open(blue_path, "wb") as f:
             f.write(blue_img_bytes)
         
-        # Decode and save red image
-        red_img_bytes = base64.b64decode(red_image_base64)
+        # Save red image
         with open(red_path, "wb") as f:
             f.write(red_img_bytes)
         
@@ -198,12 +250,12 @@ async def select_holds_api(id: str, request: SelectRequest):
         error_detail = f"Error processing images: {str(e)}\n{traceback.format_exc()}"
         raise HTTPException(status_code=500, detail=error_detail)
 
-async def compare_with_gemini(red_image_base64: str, images_dir: str) -> tuple:
+async def compare_with_gemini(red_image_bytes: bytes, images_dir: str) -> tuple:
     """
     Compare red highlighted image with all existing blue highlighted images using Gemini API.
     
     Args:
-        red_image_base64: Base64 encoded red highlighted image
+        red_image_bytes: JPEG bytes of the red highlighted image (downscaled for comparison)
         images_dir: Directory containing blue images
         
     Returns:
@@ -212,41 +264,59 @@ async def compare_with_gemini(red_image_base64: str, images_dir: str) -> tuple:
             - matching_image_filename: Filename of matching image if found, None otherwise
             - is_match: Boolean indicating if a match was found
     """
-    # Get Gemini API key
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable is not set")
-    
-    # Configure Gemini
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-3-pro-preview')
+    model = await get_gemini_model()
     
     # Get all existing blue images
-    # Use thread pool for file I/O to avoid blocking the event loop
+    # Saved routes never change once written, so reuse cached bytes and only
+    # read and downscale new files (in the thread pool to avoid blocking the event loop)
     blue_images = []
     blue_filenames = []
     if os.path.exists(images_dir):
-        def read_image_file(filename):
-            filepath = os.path.join(images_dir, filename)
-            if os.path.isfile(filepath):
+        def read_image_file(filepath):
+            try:
                 with open(filepath, "rb") as f:
                     img_bytes = f.read()
-                img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-                return {
-                    "filename": filename,
-                    "base64": img_base64
-                }
-            return None
-        
-        filenames = [f for f in os.listdir(images_dir) 
-                     if f.startswith("blue_") and f.endswith(".jpg")]
-        blue_filenames = filenames.copy()
-        
-        # Read files in parallel using thread pool to prevent blocking
+                return encode_comparison_jpeg(decode_image_bytes(img_bytes))
+            except (FileNotFoundError, ValueError, cv2.error):
+                # Missing, truncated or otherwise undecodable files are skipped
+                return None
+        
+        with os.scandir(images_dir) as it:
+            entries = [e for e in it
+                       if e.name.startswith("blue_") and e.name.endswith(".jpg") and e.is_file()]
+        
+        # DirEntry caches its stat result, so each file is only stat'ed once
+        stale = []
+        for entry in entries:
+            st = entry.stat()
+            if st.st_size == 0:
+                # Empty file (e.g. a route still being written); nothing to compare yet
+                _blue_image_cache.pop(entry.name, None)
+                continue
+            cached = _blue_image_cache.get(entry.name)
+            if cached is None or cached[:2] != (st.st_mtime, st.st_size):
+                stale.append(entry)
+        
+        # Read new or changed files in parallel using thread pool to prevent blocking
         loop = asyncio.get_event_loop()
-        tasks = [loop.run_in_executor(executor, read_image_file, f) for f in filenames]
+        tasks = [loop.run_in_executor(executor, read_image_file, e.path) for e in stale]
         results = await asyncio.gather(*tasks)
-        blue_images = [r for r in results if r is not None]
+        for entry, img_bytes in zip(stale, results):
+            if img_bytes is not None:
+                st = entry.stat()
+                _blue_image_cache[entry.name] = (st.st_mtime, st.st_size, img_bytes)
+        
+        # Evict cached images whose files have been removed
+        for filename in set(_blue_image_cache) - {e.name for e in entries}:
+            del _blue_image_cache[filename]
+        
+        for entry in entries:
+            if entry.name in _blue_image_cache:
+                blue_filenames.append(entry.name)
+                blue_images.append({
+                    "filename": entry.name,
+                    "data": _blue_image_cache[entry.name][2]
+                })
     
     if len(blue_images) == 0:
         return {
@@ -287,27 +357,21 @@ Output format:
     content_parts = [prompt]
     
     # Add red image (query image)
-    red_img_data = base64.b64decode(red_image_base64)
     content_parts.append({
         "mime_type": "image/jpeg",
-        "data": red_img_data
+        "data": red_image_bytes
     })
     
     # Add all blue (reference) images
     for blue_img in blue_images:
-        blue_img_data = base64.b64decode(blue_img["base64"])
         content_parts.append({
             "mime_type": "image/jpeg",
-            "data": blue_img_data
+            "data": blue_img["data"]
         })
     
-    # Call Gemini API in a thread pool to avoid blocking the event loop
-    # This prevents the terminal/server from freezing during long API calls
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        executor,
-        lambda: model.generate_content(content_parts)
-    )
+    # Call Gemini API asynchronously so the request waits on the event loop
+    # instead of tying up a thread pool worker for the whole API call
+    response = await model.generate_content_async(content_parts)
     response_text = response.text.strip()
     
     # Parse response to extract answer and explanation
@@ -322,24 +386,16 @@ Output format:
         is_match = True
         
         # Try to identify which image matched
-        # Look for patterns like "Image 1", "Image 2", "first image", "second image", etc.
-        for i, filename in enumerate(blue_filenames):
-            image_num = i + 1
-            # Check for various patterns
-            patterns = [
-                f"image {image_num}",
-                f"image{image_num}",
-                f"the {image_num}{'st' if image_num == 1 else 'nd' if image_num == 2 else 'rd' if image_num == 3 else 'th'} image",
-                f"{image_num}{'st' if image_num == 1 else 'nd' if image_num == 2 else 'rd' if image_num == 3 else 'th'} image",
-                ("first image" if image_num == 1 else "second image" if image_num == 2 else "third image" if image_num == 3 else None)
-            ]
-            
-            for pattern in patterns:
-                if pattern and pattern in response_lower:
-                    matching_image_filename = filename
-                    break
-            
-            if matching_image_filename:
+        # Look for patterns like "Image 1", "Image 2", "2nd image", "first image", etc.
+        for m in _IMAGE_REF_RE.finditer(response_lower):
+            if m.group(1):
+                image_num = int(m.group(1))
+            elif m.group(2):
+                image_num = int(m.group(2))
+            else:
+                image_num = _ORDINAL_WORDS[m.group(3)]
+            if 1 <= image_num <= len(blue_filenames):
+                matching_image_filename = blue_filenames[image_num - 1]
                 break
         
         # If no specific image identified but it's a match, use the first one
@@ -399,17 +455,15 @@ async def get_routes():
         blue_images = []
         
         # List all files in images directory that start with "blue_"
-        if os.path.exists(images_dir):
-            for filename in os.listdir(images_dir):
-                if filename.startswith("blue_") and filename.endswith(".jpg"):
-                    filepath = os.path.join(images_dir, filename)
-                    if os.path.isfile(filepath):
-                        # Get file modification time for sorting
-                        mtime = os.path.getmtime(filepath)
-                        blue_images.append({
-                            "filename": filename,
-                            "modified_time": mtime
-                        })
+        # (os.scandir reuses directory entry info instead of stat'ing each path separately)
+        with os.scandir(images_dir) as it:
+            for entry in it:
+                if entry.name.startswith("blue_") and entry.name.endswith(".jpg") and entry.is_file():
+                    # Get file modification time for sorting
+                    blue_images.append({
+                        "filename": entry.name,
+                        "modified_time": entry.stat().st_mtime
+                    })
         
         # Sort by modification time (newest first)
         blue_images.sort(key=lambda x: x["modified_time"], reverse=True)
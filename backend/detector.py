@@ -3,208 +3,475 @@ import cv2
 import numpy as np
 import json
 import os
-import uuid
-import base64
-from sklearn.cluster import KMeans
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+import pybase64
 from dotenv import load_dotenv
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; colors are classified with NumPy instead
+    njit = None
+
 # Load environment variables
 load_dotenv()
 
+# Requests already run in parallel on thread pools, so keep OpenCV's internal
+# parallelism small to avoid oversubscribing the cores
+cv2.setUseOptimized(True)
+cv2.setNumThreads(int(os.getenv("OPENCV_THREADS", "1")))
+
+# JPEG quality used when encoding images returned to the frontend
+JPEG_QUALITY = 85
+
+# Longer side (in pixels) of images sent to Gemini for route comparison
+COMPARISON_IMAGE_SIZE = 768
+
+# Thread pool for per-hold color classification (the NumPy array ops and the nogil numba kernel both release the GIL)
+_color_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
 # --- Load model (cached globally) ---
+ROBOFLOW_WORKSPACE = "spraywall-id"
+ROBOFLOW_PROJECT = "climbing-rv6vd"
+ROBOFLOW_VERSION = 1
+# Minimum confidence (percent) for returned predictions
+PREDICTION_CONFIDENCE = 40
+
 _model = None
+_model_lock = threading.Lock()
 
 def get_model():
-    """Get or initialize the Roboflow model (singleton pattern)"""
+    """Get or initialize the Roboflow model (singleton pattern, safe to call from worker threads)"""
     global _model
     if _model is None:
-        api_key = os.getenv("ROBOFLOW_API_KEY")
-        if not api_key:
-            raise ValueError("ROBOFLOW_API_KEY environment variable is not set. Please create a .env file with your API key.")
-        
-        rf = Roboflow(api_key=api_key)
-        project = rf.workspace("spraywall-id").project("climbing-rv6vd")
-        _model = project.version(1).model
+        with _model_lock:
+            if _model is None:
+                api_key = os.getenv("ROBOFLOW_API_KEY")
+                if not api_key:
+                    raise ValueError("ROBOFLOW_API_KEY environment variable is not set. Please create a .env file with your API key.")
+                
+                rf = Roboflow(api_key=api_key)
+                project = rf.workspace(ROBOFLOW_WORKSPACE).project(ROBOFLOW_PROJECT)
+                _model = project.version(ROBOFLOW_VERSION).model
     return _model
 
+# --- Prediction cache (SQLite, keyed by a hash of the model settings and the resized image) ---
+PREDICTIONS_CACHE_PATH = os.getenv("PREDICTIONS_CACHE_PATH", "predictions_cache.sqlite3")
+
+# Prediction fields read by detect_holds (the only ones cached and returned)
+PREDICTION_FIELDS = ("x", "y", "width", "height", "confidence", "class")
+
+# Oldest entries beyond this many are deleted whenever a new prediction is stored
+PREDICTIONS_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTIONS_CACHE_MAX_ENTRIES", "1000"))
+
+_predictions_cache_ready = False
+_predictions_cache_lock = threading.Lock()
+
+def _connect_predictions_cache():
+    global _predictions_cache_ready
+    conn = sqlite3.connect(PREDICTIONS_CACHE_PATH)
+    if not _predictions_cache_ready:
+        with _predictions_cache_lock:
+            if not _predictions_cache_ready:
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS prediction_cache "
+                        "(key TEXT PRIMARY KEY, predictions_json TEXT, created_at REAL)"
+                    )
+                    conn.execute(
+                        "CREATE INDEX IF NOT EXISTS prediction_cache_created_at "
+                        "ON prediction_cache (created_at)"
+                    )
+                _predictions_cache_ready = True
+    return conn
+
+def predict_holds(img: np.ndarray) -> dict:
+    """
+    Run Roboflow prediction on a resized image, reusing cached results for identical images.
+    
+    Args:
+        img: Resized BGR image array
+        
+    Returns:
+        dict: {"predictions": [...]} with only the fields detect_holds uses
+              (x, y, width, height, confidence, class), whether or not it was cached
+    """
+    # The database outlives the process, so the key covers the model and confidence
+    # too; changing either misses the cache instead of serving stale predictions
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{ROBOFLOW_WORKSPACE}/{ROBOFLOW_PROJECT}/{ROBOFLOW_VERSION}@{PREDICTION_CONFIDENCE}".encode())
+    hasher.update(img.tobytes())
+    key = hasher.hexdigest()
+    with closing(_connect_predictions_cache()) as conn:
+        row = conn.execute("SELECT predictions_json FROM prediction_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        
+        # Roboflow accepts the BGR array directly and encodes it in memory for upload.
+        # The SDK also attaches the input array to every prediction ("image_path"),
+        # so keep only the JSON-serializable fields we actually read.
+        result = get_model().predict(img, confidence=PREDICTION_CONFIDENCE).json()
+        predictions = {
+            "predictions": [
+                {k: p[k] for k in PREDICTION_FIELDS if k in p}
+                for p in result["predictions"]
+            ]
+        }
+        
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, predictions_json, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(predictions), time.time())
+            )
+            conn.execute(
+                "DELETE FROM prediction_cache WHERE key NOT IN "
+                "(SELECT key FROM prediction_cache ORDER BY created_at DESC LIMIT ?)",
+                (PREDICTIONS_CACHE_MAX_ENTRIES,)
+            )
+    return predictions
+
+# --- Decoded image cache (in-memory LRU, keyed by a hash of the base64 string) ---
+# Lets repeated /select requests for the same image skip the JPEG decode
+DECODED_IMAGE_CACHE_SIZE = 8
+_decoded_images = OrderedDict()
+_decoded_images_lock = threading.Lock()
+
 # --- Color Helpers ---
-def hsv_to_color_name(h, s, v):
+_HUE_COLOR_NAMES = ("red", "yellow", "green", "blue", "purple")
+
+# Lookup table mapping OpenCV hue (0-179) to an index into _HUE_COLOR_NAMES
+_HUE_TO_COLOR = np.empty(180, dtype=np.uint8)
+_HUE_TO_COLOR[0:15] = 0     # red
+_HUE_TO_COLOR[15:35] = 1    # yellow
+_HUE_TO_COLOR[35:85] = 2    # green
+_HUE_TO_COLOR[85:130] = 3   # blue
+_HUE_TO_COLOR[130:165] = 4  # purple
+_HUE_TO_COLOR[165:180] = 0  # red (hue wraps around)
+
+def _achromatic_color_name(s, v):
+    """Return "black"/"white"/"gray" for dark or unsaturated colors, otherwise None."""
     if v < 50:
         return "black"
     if s < 50:
         return "white" if v > 200 else "gray"
+    return None
 
-    if 0 <= h < 15 or 165 <= h <= 180:
-        return "red"
-    elif 15 <= h < 35:
-        return "yellow"
-    elif 35 <= h < 85:
-        return "green"
-    elif 85 <= h < 130:
-        return "blue"
-    elif 130 <= h < 165:
-        return "purple"
+def hsv_to_color_name(h, s, v):
+    achromatic = _achromatic_color_name(s, v)
+    if achromatic:
+        return achromatic
+
+    h = int(h)
+    if 0 <= h <= 180:
+        return _HUE_COLOR_NAMES[_HUE_TO_COLOR[min(h, 179)]]
     return "unknown"
 
-def get_dominant_color_centered(crop, fraction=0.5):
-    h, w, _ = crop.shape
-    h_center = int(h * fraction)
-    w_center = int(w * fraction)
-    y1 = (h - h_center) // 2
-    y2 = y1 + h_center
-    x1 = (w - w_center) // 2
-    x2 = x1 + w_center
+def get_center_boxes(boxes, width, height, fraction=0.5):
+    """
+    Compute the centered sub-box covering `fraction` of each box, for all boxes at once.
+    
+    Args:
+        boxes: int32 array of shape (N, 4) with (x1, y1, x2, y2) rows
+        width: Image width used to clip the boxes
+        height: Image height used to clip the boxes
+        fraction: Fraction of each (clipped) box's width and height to keep
+        
+    Returns:
+        np.ndarray: int32 array of shape (N, 4) with the centered (x1, y1, x2, y2) rows
+    """
+    x1 = np.clip(boxes[:, 0], 0, width)
+    y1 = np.clip(boxes[:, 1], 0, height)
+    x2 = np.clip(boxes[:, 2], 0, width)
+    y2 = np.clip(boxes[:, 3], 0, height)
+    box_w = np.maximum(x2 - x1, 0)
+    box_h = np.maximum(y2 - y1, 0)
+    
+    center_w = (box_w * fraction).astype(np.int32)
+    center_h = (box_h * fraction).astype(np.int32)
+    cx1 = x1 + (box_w - center_w) // 2
+    cy1 = y1 + (box_h - center_h) // 2
+    return np.stack([cx1, cy1, cx1 + center_w, cy1 + center_h], axis=1)
+
+def _color_stats_numpy(hsv_crop, hue_to_color, n_colors):
+    """Per-color pixel counts and S/V sums over the kept (saturated, not too bright) pixels."""
+    # Per-channel 2-D views of the crop; reshaping the strided slice would copy it
+    hue, sat, val = hsv_crop[..., 0], hsv_crop[..., 1], hsv_crop[..., 2]
 
-    center_crop = crop[y1:y2, x1:x2]
+    # Ignore low saturation / very bright pixels (likely wall)
+    keep = (sat > 50) & (val < 220)
 
-    # Convert to HSV
-    hsv = cv2.cvtColor(center_crop, cv2.COLOR_BGR2HSV)
-    pixels = hsv.reshape((-1, 3))
+    # Map kept hues to color buckets through the lookup table, so red hues at
+    # both ends of the range (OpenCV hue is 0-179) count together
+    labels = hue_to_color[hue[keep]]
+    counts = np.bincount(labels, minlength=n_colors)
+    s_sum = np.bincount(labels, weights=sat[keep], minlength=n_colors)
+    v_sum = np.bincount(labels, weights=val[keep], minlength=n_colors)
+    return counts, s_sum, v_sum
 
-    # Filter out low saturation / very bright pixels (likely wall)
-    pixels = np.array([p for p in pixels if p[1] > 50 and p[2] < 220])
-    if len(pixels) == 0:
+def _color_stats_loop(hsv_crop, hue_to_color, n_colors):
+    """Same result as _color_stats_numpy in a single scalar pass (meant to be numba-compiled)."""
+    counts = np.zeros(n_colors, np.int64)
+    s_sum = np.zeros(n_colors, np.float64)
+    v_sum = np.zeros(n_colors, np.float64)
+    for y in range(hsv_crop.shape[0]):
+        for x in range(hsv_crop.shape[1]):
+            s = hsv_crop[y, x, 1]
+            v = hsv_crop[y, x, 2]
+            if s > 50 and v < 220:
+                c = hue_to_color[hsv_crop[y, x, 0]]
+                counts[c] += 1
+                s_sum[c] += s
+                v_sum[c] += v
+    return counts, s_sum, v_sum
+
+# With numba installed the scalar loop is compiled to native code that releases the
+# GIL and allocates no temporary masks per hold; otherwise use the NumPy version
+_color_stats = njit(cache=True, nogil=True)(_color_stats_loop) if njit is not None else _color_stats_numpy
+
+def get_dominant_color(hsv_crop):
+    """Return the color name of the dominant hold color in an HSV crop."""
+    num_pixels = hsv_crop.shape[0] * hsv_crop.shape[1]
+    if num_pixels == 0:
         return "unknown"
 
-    # Adjust number of clusters based on available pixels
-    n_clusters = min(3, len(pixels))
-    if n_clusters == 1:
-        dominant_cluster = pixels[0]
-    else:
-        kmeans = KMeans(n_clusters=n_clusters, n_init="auto")
-        kmeans.fit(pixels)
-        labels, counts = np.unique(kmeans.labels_, return_counts=True)
-        dominant_cluster = kmeans.cluster_centers_[labels[np.argmax(counts)]]
+    counts, s_sum, v_sum = _color_stats(hsv_crop, _HUE_TO_COLOR, len(_HUE_COLOR_NAMES))
+    color_idx = int(counts.argmax())
+    if counts[color_idx] == 0:
+        return "unknown"
 
-    h, s, v = dominant_cluster
-    return hsv_to_color_name(h, s, v)
+    # Saturation/value are averaged over the kept pixels of the most common color
+    s_mean = s_sum[color_idx] / counts[color_idx]
+    v_mean = v_sum[color_idx] / counts[color_idx]
+    return _achromatic_color_name(s_mean, v_mean) or _HUE_COLOR_NAMES[color_idx]
+
+def resize_for_detection(img: np.ndarray, size: int) -> np.ndarray:
+    """
+    Resize an image to size x size for detection.
+    
+    Large images are first halved with cv2.pyrDown (a fast Gaussian blur + subsample)
+    while both sides are still at least twice the target, then finished with INTER_AREA.
+    
+    Args:
+        img: BGR image array
+        size: Target width and height
+        
+    Returns:
+        np.ndarray: Resized BGR image
+    """
+    while img.shape[0] >= 2 * size and img.shape[1] >= 2 * size:
+        img = cv2.pyrDown(img)
+    return cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
 
-def detect_holds(image_path: str):
+def detect_holds(image: np.ndarray | bytes):
     """
     Detect climbing holds in an image and identify their colors.
     
     Args:
-        image_path: Path to the input image file
+        image: BGR image array, or encoded image file bytes
         
     Returns:
-        tuple: (detections_data, original_image_path)
+        tuple: (detections_data, resized_image)
             - detections_data: Dictionary with structured detection results including bounding boxes
-            - original_image_path: Path to the original resized image (without labels)
+            - resized_image: The resized BGR image (without labels)
     """
-    # Generate unique filenames for this request
-    unique_id = str(uuid.uuid4())[:8]
-    resized_path = f"temp_resized_{unique_id}.jpg"
+    # --- Load and resize image ---
+    if isinstance(image, (bytes, bytearray)):
+        # cv2.imdecode raises (rather than returning None) on an empty buffer
+        original_img = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR) if image else None
+    else:
+        original_img = image
+    if original_img is None:
+        raise ValueError("Could not decode uploaded image")
     
-    try:
-        # --- Load and resize image ---
-        original_img = cv2.imread(image_path)
-        if original_img is None:
-            raise ValueError(f"Could not read image from {image_path}")
-        
-        original_height, original_width = original_img.shape[:2]
-        img = cv2.resize(original_img, (1024, 1024), interpolation=cv2.INTER_AREA)
-        cv2.imwrite(resized_path, img)
-        
-        # --- Get model and predict ---
-        model = get_model()
-        result = model.predict(resized_path, confidence=40)
-        predictions = result.json()
-        
-        # --- Load resized image for processing ---
-        image = cv2.imread(resized_path)
-        
-        # --- Process each detection and format for frontend ---
-        formatted_detections = []
-        for idx, pred in enumerate(predictions["predictions"]):
-            # Roboflow returns center-based coordinates
-            x_center = int(pred["x"])
-            y_center = int(pred["y"])
-            w = int(pred["width"])
-            h = int(pred["height"])
-            
-            # Convert to corner coordinates (x1, y1, x2, y2) for 1024x1024 image
-            x1 = x_center - w // 2
-            y1 = y_center - h // 2
-            x2 = x_center + w // 2
-            y2 = y_center + h // 2
-            
-            # Get color from crop
-            crop = image[y1:y2, x1:x2]
-            if crop.size > 0:
-                color = get_dominant_color_centered(crop, fraction=0.7)
-            else:
-                color = "unknown"
-            
-            # Format detection data for frontend
-            detection = {
-                "id": idx,  # Unique ID for selection
-                "color": color,
-                "confidence": pred.get("confidence", 0),
-                "class": pred.get("class", "hold"),
-                # Bounding box coordinates in resized image (1024x1024)
-                "bbox": {
-                    "x1": x1,
-                    "y1": y1,
-                    "x2": x2,
-                    "y2": y2,
-                    "width": w,
-                    "height": h,
-                    "center": {"x": x_center, "y": y_center}
-                },
-                # Original coordinates from Roboflow (for reference)
-                "raw": {
-                    "x": x_center,
-                    "y": y_center,
-                    "width": w,
-                    "height": h
-                }
-            }
-            formatted_detections.append(detection)
-        
-        # Return structured data with original image (no labels drawn)
-        detections_data = {
-            "detections": formatted_detections,
-            "image_dimensions": {
-                "width": 1024,  # Resized image width
-                "height": 1024,  # Resized image height
-                "original_width": original_width,
-                "original_height": original_height
+    original_height, original_width = original_img.shape[:2]
+    img = resize_for_detection(original_img, 1024)
+    # Only the resized image is used from here on; release the full-resolution decode
+    # instead of holding it for the duration of the Roboflow call
+    del original_img
+    
+    # --- Predict (cached for repeat uploads of the same image) ---
+    predictions = predict_holds(img)
+    
+    # Convert to HSV once; each detection slices a view of this array
+    image_hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    
+    # Roboflow returns center-based coordinates
+    preds = predictions["predictions"]
+    centers = np.array(
+        [[p["x"], p["y"], p["width"], p["height"]] for p in preds], dtype=np.int32
+    ).reshape(-1, 4)
+    x_c, y_c, half_w, half_h = centers[:, 0], centers[:, 1], centers[:, 2] // 2, centers[:, 3] // 2
+    
+    # Convert to corner coordinates (x1, y1, x2, y2) for 1024x1024 image
+    boxes = np.stack([x_c - half_w, y_c - half_h, x_c + half_w, y_c + half_h], axis=1)
+    
+    # Color is sampled from the center 70% of each box (clipped to the image) to avoid the wall
+    center_boxes = get_center_boxes(boxes, img.shape[1], img.shape[0], fraction=0.7)
+    
+    # Classify each center crop (a view of the HSV image) in parallel; empty crops yield "unknown"
+    crops = [image_hsv[cy1:cy2, cx1:cx2] for cx1, cy1, cx2, cy2 in center_boxes.tolist()]
+    colors = list(_color_executor.map(get_dominant_color, crops))
+    
+    # --- Format each detection for frontend ---
+    formatted_detections = []
+    for idx, (pred, color, (x_center, y_center, w, h), (x1, y1, x2, y2)) in enumerate(
+        zip(preds, colors, centers.tolist(), boxes.tolist())
+    ):
+        # Format detection data for frontend
+        detection = {
+            "id": idx,  # Unique ID for selection
+            "color": color,
+            "confidence": pred.get("confidence", 0),
+            "class": pred.get("class", "hold"),
+            # Bounding box coordinates in resized image (1024x1024)
+            "bbox": {
+                "x1": x1,
+                "y1": y1,
+                "x2": x2,
+                "y2": y2,
+                "width": w,
+                "height": h,
+                "center": {"x": x_center, "y": y_center}
             },
-            "total_detections": len(formatted_detections)
+            # Original coordinates from Roboflow (for reference)
+            "raw": {
+                "x": x_center,
+                "y": y_center,
+                "width": w,
+                "height": h
+            }
         }
-        
-        return detections_data, resized_path
-        
-    except Exception as e:
-        # Cleanup on error
-        if os.path.exists(resized_path):
-            os.remove(resized_path)
-        raise e
+        formatted_detections.append(detection)
+    
+    # Return structured data with original image (no labels drawn)
+    detections_data = {
+        "detections": formatted_detections,
+        "image_dimensions": {
+            "width": 1024,  # Resized image width
+            "height": 1024,  # Resized image height
+            "original_width": original_width,
+            "original_height": original_height
+        },
+        "total_detections": len(formatted_detections)
+    }
+    
+    return detections_data, img
 
 
-def create_highlighted_image(image_base64: str, selected_detections: list, highlight_color: tuple) -> str:
+def decode_image_bytes(img_bytes: bytes) -> np.ndarray:
     """
-    Create an image with only selected holds highlighted in the specified color.
+    Decode encoded image bytes (e.g. JPEG) into a BGR image array.
     
     Args:
-        image_base64: Base64 encoded image string (without data URI prefix)
-        selected_detections: List of detection objects with bbox information
-        highlight_color: BGR color tuple (e.g., (255, 0, 0) for blue, (0, 0, 255) for red)
+        img_bytes: Encoded image file contents
         
     Returns:
-        Base64 encoded JPEG image string
+        np.ndarray: Decoded BGR image
     """
-    # Decode base64 image
-    img_bytes = base64.b64decode(image_base64)
     nparr = np.frombuffer(img_bytes, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
     if img is None:
+        raise ValueError("Could not decode image")
+    
+    return img
+
+
+def _decoded_image_key(image_base64: str) -> str:
+    return hashlib.blake2b(image_base64.encode("ascii"), digest_size=16).hexdigest()
+
+
+def decode_base64_image(image_base64: str) -> np.ndarray:
+    """
+    Decode a base64 encoded image string into a BGR image array.
+    
+    Recently seen images are served from an in-memory LRU cache instead of being decoded again.
+    
+    Args:
+        image_base64: Base64 encoded image string (without data URI prefix)
+        
+    Returns:
+        np.ndarray: Decoded BGR image (a fresh array the caller may draw on)
+    """
+    key = _decoded_image_key(image_base64)
+    with _decoded_images_lock:
+        cached = _decoded_images.get(key)
+        if cached is not None:
+            _decoded_images.move_to_end(key)
+    if cached is not None:
+        return cached.copy()
+    
+    try:
+        img = decode_image_bytes(pybase64.b64decode(image_base64))
+    except ValueError:
         raise ValueError("Could not decode image from base64")
     
-    # Create a copy of the image
-    highlighted_img = img.copy()
+    # The cached copy is read-only; hits hand out copies of it
+    cached = img.copy()
+    cached.flags.writeable = False
+    with _decoded_images_lock:
+        _decoded_images[key] = cached
+        _decoded_images.move_to_end(key)
+        while len(_decoded_images) > DECODED_IMAGE_CACHE_SIZE:
+            _decoded_images.popitem(last=False)
+    return img
+
+
+def encode_jpeg(img: np.ndarray) -> bytes:
+    """
+    Encode a BGR image array as JPEG bytes.
+    
+    Args:
+        img: BGR image array
+        
+    Returns:
+        bytes: JPEG encoded image
+    """
+    # Optimized Huffman tables shrink the output (and the base64 payload) at no quality cost
+    ok, buffer = cv2.imencode(
+        '.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    )
+    if not ok:
+        raise ValueError("Could not encode image as JPEG")
+    return buffer.tobytes()
+
+
+def encode_comparison_jpeg(img: np.ndarray) -> bytes:
+    """
+    Downscale an image so its longer side is at most COMPARISON_IMAGE_SIZE and encode it as JPEG.
+    
+    Used for images sent to Gemini, where fewer pixels means fewer vision tokens.
+    
+    Args:
+        img: BGR image array
+        
+    Returns:
+        bytes: JPEG encoded (downscaled) image
+    """
+    h, w = img.shape[:2]
+    scale = COMPARISON_IMAGE_SIZE / max(h, w)
+    if scale < 1:
+        img = cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+    return encode_jpeg(img)
+
+
+def create_highlighted_image_from_array(img: np.ndarray, selected_detections: list, highlight_color: tuple) -> np.ndarray:
+    """
+    Draw the selected holds onto an already decoded image in the specified color.
     
+    Args:
+        img: BGR image array (drawn on in place)
+        selected_detections: List of detection objects with bbox information
+        highlight_color: BGR color tuple (e.g., (255, 0, 0) for blue, (0, 0, 255) for red)
+        
+    Returns:
+        np.ndarray: The highlighted BGR image
+    """
     # Draw bounding boxes for selected detections only
     for detection in selected_detections:
         bbox = detection.get("bbox", {})
@@ -221,13 +488,9 @@ def create_highlighted_image(image_base64: str, selected_detections: list, highl
             continue  # Skip invalid bounding boxes
         
         # Draw only the bounding box border (no fill/overlay) to preserve hold colors
-        cv2.rectangle(highlighted_img, (x1, y1), (x2, y2), highlight_color, 4)
-    
-    # Encode image to JPEG base64
-    _, buffer = cv2.imencode('.jpg', highlighted_img)
-    img_base64 = base64.b64encode(buffer).decode('utf-8')
+        cv2.rectangle(img, (x1, y1), (x2, y2), highlight_color, 4)
     
-    return img_base64
+    return img
 
 
 # Allow running as a script for testing
@@ -239,13 +502,15 @@ if __name__ == "__main__":
         print(f"Error: Image file '{image_path}' not found.")
         sys.exit(1)
     
-    detections_data, image_path = detect_holds(image_path)
+    detections_data, resized_img = detect_holds(cv2.imread(image_path))
     
-    # Save JSON for script usage
+    # Save resized image and JSON for script usage
+    resized_path = f"{os.path.splitext(image_path)[0]}_resized.jpg"
+    cv2.imwrite(resized_path, resized_img)
     json_path = "detection_with_color.json"
     with open(json_path, "w") as f:
         json.dump(detections_data, f, indent=2)
     
-    print(f"Image saved: {image_path}")
+    print(f"Image saved: {resized_path}")
     print(f"Saved: {json_path}")
     print(f"Total detections: {detections_data['total_detections']}")
\ No newline at end of file